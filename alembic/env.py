@@ -0,0 +1,33 @@
+from logging.config import fileConfig
+
+from alembic import context
+import sqlalchemy
+
+from connect_connector import connect_with_connector
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+
+def run_migrations_offline() -> None:
+    """Emits the migration SQL to stdout without connecting to the database."""
+    context.configure(url="mysql+pymysql://", literal_binds=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Runs the migrations against the Cloud SQL instance given by INSTANCE_CONNECTION_NAME."""
+    engine = connect_with_connector(poolclass=sqlalchemy.pool.NullPool)
+    with engine.connect() as connection:
+        context.configure(connection=connection)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,46 @@
+"""Create businesses and reviews tables
+
+The statements keep IF NOT EXISTS so databases created by the app before migrations were introduced
+can be upgraded in place.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15
+"""
+from alembic import op
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        'CREATE TABLE IF NOT EXISTS businesses ('
+        'business_id BIGINT NOT NULL AUTO_INCREMENT, '
+        'owner_id INT NOT NULL,'
+        'name VARCHAR(50) NOT NULL, '
+        'street_address VARCHAR(100) NOT NULL, '
+        'city VARCHAR(50) NOT NULL, '
+        'state VARCHAR(2) NOT NULL, '
+        'zip_code INT NOT NULL, '
+        'PRIMARY KEY (business_id)'
+        ')'
+    )
+    op.execute(
+        'CREATE TABLE IF NOT EXISTS reviews ('
+        'review_id BIGINT NOT NULL AUTO_INCREMENT, '
+        'user_id INT NOT NULL, '
+        'business_id BIGINT NOT NULL, '
+        'stars INT NOT NULL, '
+        'review_text VARCHAR(1000), '
+        'PRIMARY KEY (review_id), '
+        'FOREIGN KEY (business_id) REFERENCES businesses(business_id) ON DELETE CASCADE'
+        ')'
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TABLE IF EXISTS reviews')
+    op.execute('DROP TABLE IF EXISTS businesses')
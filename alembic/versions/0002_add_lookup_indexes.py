@@ -0,0 +1,37 @@
+"""Add indexes for the owner, user and duplicate-review lookups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-15
+"""
+from alembic import op
+
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('idx_businesses_owner', 'businesses', ['owner_id'])
+    op.create_index('idx_reviews_business_user', 'reviews', ['business_id', 'user_id'])
+    op.create_index('idx_reviews_user', 'reviews', ['user_id'])
+    # A previous downgrade leaves a plain business_id index behind that the composite index now makes redundant.
+    # MySQL has no DROP INDEX IF EXISTS, so the drop is decided in SQL to also work with --sql output.
+    op.execute(
+        "SET @drop_idx_reviews_business = (SELECT IF(COUNT(*) > 0, 'DROP INDEX idx_reviews_business ON reviews', 'DO 0') "
+        "FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'reviews' AND index_name = 'idx_reviews_business')"
+    )
+    op.execute('PREPARE drop_idx_reviews_business FROM @drop_idx_reviews_business')
+    op.execute('EXECUTE drop_idx_reviews_business')
+    op.execute('DEALLOCATE PREPARE drop_idx_reviews_business')
+
+
+def downgrade() -> None:
+    op.drop_index('idx_reviews_user', table_name='reviews')
+    # InnoDB dropped its implicit foreign key index on reviews.business_id when the composite index was created,
+    # so the foreign key needs a replacement index before the composite one can be dropped
+    op.create_index('idx_reviews_business', 'reviews', ['business_id'])
+    op.drop_index('idx_reviews_business_user', table_name='reviews')
+    op.drop_index('idx_businesses_owner', table_name='businesses')
@@ -0,0 +1,42 @@
+import os
+
+from google.cloud.sql.connector import Connector, IPTypes
+import pymysql
+from pymysql.constants import CLIENT
+
+import sqlalchemy
+
+
+def connect_with_connector(**pool_kwargs) -> sqlalchemy.engine.base.Engine:
+    """
+    Initializes a connection pool for a Cloud SQL instance of MySQL using the Cloud SQL Python Connector.
+    Any keyword arguments (pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping, ...) are
+    forwarded to sqlalchemy.create_engine to size and configure the QueuePool.
+    """
+    instance_connection_name = os.environ["INSTANCE_CONNECTION_NAME"]  # e.g. 'project:region:instance'
+    db_user = os.environ["DB_USER"]
+    db_pass = os.environ["DB_PASS"]
+    db_name = os.environ["DB_NAME"]
+
+    ip_type = IPTypes.PRIVATE if os.environ.get("PRIVATE_IP") else IPTypes.PUBLIC
+
+    connector = Connector(ip_type)
+
+    def getconn() -> pymysql.connections.Connection:
+        conn: pymysql.connections.Connection = connector.connect(
+            instance_connection_name,
+            "pymysql",
+            user=db_user,
+            password=db_pass,
+            db=db_name,
+            # Report matched rather than changed rows so UPDATE rowcount can tell a missing row from a no-op update
+            client_flag=CLIENT.FOUND_ROWS,
+        )
+        return conn
+
+    pool = sqlalchemy.create_engine(
+        "mysql+pymysql://",
+        creator=getconn,
+        **pool_kwargs,
+    )
+    return pool
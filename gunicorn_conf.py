@@ -0,0 +1,24 @@
+"""
+Gunicorn configuration. Run with: gunicorn -c gunicorn_conf.py main:app
+
+Every route spends nearly all of its time waiting on MySQL, so gevent workers are used to keep many requests
+in flight per process. The schema is not created here; apply it first with: alembic upgrade head
+"""
+import multiprocessing
+import os
+
+bind = "0.0.0.0:" + os.environ.get("PORT", "8080")
+worker_class = "gevent"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2 * multiprocessing.cpu_count() + 1))
+worker_connections = int(os.environ.get("WORKER_CONNECTIONS", 1000))
+# Hold idle connections open a little longer than the default so clients paging through lists reuse their socket
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+# Import the app once in the master so module-level setup (e.g. the compiled SQL statements) is shared by all
+# workers. The connection pool is still created per worker in post_fork.
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Builds a connection pool per worker, since a pool must not be shared across a fork."""
+    import main
+    main.init_db()
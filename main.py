@@ -1,89 +1,185 @@
 from __future__ import annotations
 
+# Patch the stdlib before sqlalchemy/pymysql are imported so socket reads yield to other greenlets
+from gevent import monkey
+monkey.patch_all()
+
 import logging
 import os
 
-from flask import Flask, request
+from flask import Flask, Response, abort, request, url_for
+from flask.json.provider import JSONProvider
+from flask_compress import Compress
 
+from cachetools import TTLCache
+import cbor2
+import orjson
+from pymysql.constants import ER
 import sqlalchemy
 
 from connect_connector import connect_with_connector
 
 BUSINESSES = "businesses"
 BUSINESS_ID = "business_id"
-BUSINESSES_REQUIRED_ATTRIBUTES = ["owner_id", "name", "street_address", "city", "state", "zip_code"]
+BUSINESSES_REQUIRED_ATTRIBUTES = frozenset(["owner_id", "name", "street_address", "city", "state", "zip_code"])
 REVIEWS = "reviews"
 REVIEW_ID = "review_id"
-REVIEWS_REQUIRED_ATTRIBUTES = ["user_id", "business_id", "stars"]
+REVIEWS_REQUIRED_ATTRIBUTES = frozenset(["user_id", "business_id", "stars"])
+REVIEWS_PUT_REQUIRED_ATTRIBUTES = frozenset(["stars"])
 POST_PUT_ERROR = {"Error" : "The request body is missing at least one of the required attributes"}
+MAX_PAGE_LIMIT = 100
+PAGINATION_ERROR = {"Error" : f"limit must be between 1 and {MAX_PAGE_LIMIT}, and offset and after must not be negative"}
+JSON_MIMETYPE = "application/json"
+CBOR_MIMETYPE = "application/cbor"
+
+# Statements are compiled once at import time and shared by every request
+SQL_INSERT_BUSINESS = sqlalchemy.text(
+    'INSERT INTO businesses(owner_id, name, street_address, city, state, zip_code) '
+    ' VALUES (:owner_id, :name, :street_address, :city, :state, :zip_code)'
+)
+SQL_LIST_BUSINESSES = sqlalchemy.text(
+    'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses '
+    'WHERE business_id > :after ORDER BY business_id LIMIT :limit'
+)
+# Deprecated: kept so clients still paging with ?offset= keep working
+SQL_LIST_BUSINESSES_BY_OFFSET = sqlalchemy.text(
+    'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses '
+    'ORDER BY business_id LIMIT :limit OFFSET :offset'
+)
+SQL_SELECT_BUSINESS = sqlalchemy.text(
+    'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses WHERE business_id=:business_id'
+)
+SQL_UPDATE_BUSINESS = sqlalchemy.text(
+    'UPDATE businesses '
+    'SET owner_id = :owner_id, name = :name, street_address = :street_address, city = :city, state = :state, zip_code = :zip_code '
+    'WHERE business_id = :business_id'
+)
+SQL_DELETE_BUSINESS = sqlalchemy.text('DELETE FROM businesses WHERE business_id=:business_id')
+SQL_LIST_OWNER_BUSINESSES = sqlalchemy.text(
+    'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses WHERE owner_id=:owner_id'
+)
+SQL_SELECT_BUSINESS_EXISTS = sqlalchemy.text('SELECT 1 FROM businesses WHERE business_id=:business_id')
+SQL_SELECT_USER_REVIEW_FOR_BUSINESS = sqlalchemy.text(
+    'SELECT 1 FROM reviews WHERE business_id=:business_id AND user_id=:user_id LIMIT 1'
+)
+SQL_INSERT_REVIEW = sqlalchemy.text(
+    'INSERT INTO reviews(user_id, business_id, stars, review_text) '
+    ' VALUES (:user_id, :business_id, :stars, :review_text)'
+)
+SQL_INSERT_REVIEW_WITHOUT_TEXT = sqlalchemy.text(
+    'INSERT INTO reviews(user_id, business_id, stars) '
+    ' VALUES (:user_id, :business_id, :stars)'
+)
+SQL_SELECT_REVIEW = sqlalchemy.text(
+    'SELECT review_id, user_id, business_id, stars, review_text FROM reviews WHERE review_id=:review_id'
+)
+SQL_SELECT_REVIEW_USER_AND_BUSINESS = sqlalchemy.text(
+    'SELECT user_id, business_id FROM reviews WHERE review_id=:review_id'
+)
+SQL_UPDATE_REVIEW = sqlalchemy.text(
+    'UPDATE reviews '
+    'SET stars = :stars, review_text = :review_text '
+    'WHERE review_id = :review_id'
+)
+SQL_UPDATE_REVIEW_WITHOUT_TEXT = sqlalchemy.text(
+    'UPDATE reviews '
+    'SET stars = :stars '
+    'WHERE review_id = :review_id'
+)
+SQL_DELETE_REVIEW = sqlalchemy.text('DELETE FROM reviews WHERE review_id=:review_id')
+SQL_LIST_USER_REVIEWS = sqlalchemy.text(
+    'SELECT review_id, user_id, business_id, stars, review_text FROM reviews WHERE user_id=:user_id'
+)
+
+
+class ORJSONProvider(JSONProvider):
+    """
+    Serializes responses and parses request bodies (including request.get_json) with orjson. Responses are encoded
+    as CBOR instead when the client's Accept header prefers application/cbor.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        if request.accept_mimetypes.best_match([JSON_MIMETYPE, CBOR_MIMETYPE]) == CBOR_MIMETYPE:
+            response = self._app.response_class(cbor2.dumps(obj), mimetype=CBOR_MIMETYPE)
+        else:
+            response = self._app.response_class(orjson.dumps(obj), mimetype=JSON_MIMETYPE)
+        response.vary.add("Accept")
+        return response
 
 
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
+app.config['COMPRESS_MIMETYPES'] = [JSON_MIMETYPE, CBOR_MIMETYPE]
+app.config['COMPRESS_ALGORITHM'] = ['br', 'gzip']
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
 
 logger = logging.getLogger()
 
 def init_connection_pool() -> sqlalchemy.engine.base.Engine:
+    """Creates the connection pool, sized by the DB_POOL_* environment variables."""
     if os.environ.get('INSTANCE_CONNECTION_NAME'):
-        return connect_with_connector()
-        
+        return connect_with_connector(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 10)),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+            pool_pre_ping=True,
+        )
+
     raise ValueError(
         'Missing database connection type. Please define INSTANCE_CONNECTION_NAME'
     )
 
 db = None
 
+# Per-worker cache of business ids known to exist, so repeat reviews of a business skip the existence query.
+# A stale entry can only outlive a delete made by another worker for the TTL; the reviews foreign key still
+# rejects the INSERT in that case.
+business_exists_cache = TTLCache(maxsize=4096, ttl=60)
+
 def init_db():
     global db
     db = init_connection_pool()
 
 
-def create_table_businesses(db: sqlalchemy.engine.base.Engine) -> None:
-    with db.connect() as conn:
-        conn.execute(
-            sqlalchemy.text(
-                'CREATE TABLE IF NOT EXISTS businesses ('
-                'business_id BIGINT NOT NULL AUTO_INCREMENT, '
-                'owner_id INT NOT NULL,'
-                'name VARCHAR(50) NOT NULL, '
-                'street_address VARCHAR(100) NOT NULL, '
-                'city VARCHAR(50) NOT NULL, '
-                'state VARCHAR(2) NOT NULL, '
-                'zip_code INT NOT NULL, '
-                'PRIMARY KEY (business_id)'
-                ');'
-            )
-        )
-        conn.commit()
-
-
-def create_table_reviews(db: sqlalchemy.engine.base.Engine) -> None:
-    with db.connect() as conn:
-        conn.execute(
-            sqlalchemy.text(
-                'CREATE TABLE IF NOT EXISTS reviews ('
-                'review_id BIGINT NOT NULL AUTO_INCREMENT, '
-                'user_id INT NOT NULL, '
-                'business_id BIGINT NOT NULL, '
-                'stars INT NOT NULL, '
-                'review_text VARCHAR(1000), '
-                'PRIMARY KEY (review_id), '
-                'FOREIGN KEY (business_id) REFERENCES businesses(business_id) ON DELETE CASCADE'
-                ');'
-            )
-        )
-        conn.commit()
-
-
 @app.route('/')
 def index():
     return 'Please navigate to /businesses or /reviews to use this API'
 
-def validate_business_post_put(request_json, attributes) -> bool:
-    """Checks to see if the json in request has all required business attributes."""
-    for key in attributes:
-        if key not in request_json:
-            return False
-    return True
+def get_request_content():
+    """Returns the decoded request body, which may be sent as either JSON or CBOR."""
+    if request.mimetype == CBOR_MIMETYPE:
+        try:
+            return cbor2.loads(request.get_data())
+        except cbor2.CBORDecodeError:
+            # Fail the same way a malformed JSON body does in get_json
+            abort(400)
+    return request.get_json()
+
+def is_json_value(value) -> bool:
+    """
+    Checks that a decoded request value only contains types JSON can represent. CBOR bodies can also decode to bytes,
+    tags, datetimes and Decimals, which must be rejected before they reach the database or the response encoder.
+    """
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return True
+    if isinstance(value, list):
+        return all(is_json_value(item) for item in value)
+    if isinstance(value, dict):
+        return all(isinstance(key, str) and is_json_value(item) for key, item in value.items())
+    return False
+
+def validate_business_post_put(request_json, attributes: frozenset) -> bool:
+    """Checks to see if the json in request is an object of JSON values containing all of the given required attributes."""
+    return isinstance(request_json, dict) and attributes.issubset(request_json) and is_json_value(request_json)
 
 def generate_self_url(url, id) -> str:
     """Generates the url meant to be returned in the 'self' portion of the returned json dict."""
@@ -92,24 +188,20 @@ def generate_self_url(url, id) -> str:
 @app.route('/' + BUSINESSES, methods=['POST'])
 def post_business():
     """Create and return a business with the given request. If a required parameter is missing, 400 is returned"""
-    content = request.get_json()
+    content = get_request_content()
     valid_business = validate_business_post_put(content, BUSINESSES_REQUIRED_ATTRIBUTES)
     if not valid_business:
         return (POST_PUT_ERROR, 400)
     try:
         with db.connect() as conn:
-            statement = sqlalchemy.text(
-                'INSERT INTO businesses(owner_id, name, street_address, city, state, zip_code) '
-                ' VALUES (:owner_id, :name, :street_address, :city, :state, :zip_code)'
-            )
-            conn.execute(statement, parameters={'owner_id': content['owner_id'], 
+            result = conn.execute(SQL_INSERT_BUSINESS, parameters={'owner_id': content['owner_id'], 
                                         'name': content['name'], 
                                         'street_address': content['street_address'], 
                                         'city': content['city'], 
                                         'state': content['state'], 
                                         'zip_code': content['zip_code']})
-            statement2 = sqlalchemy.text('SELECT last_insert_id()')
-            business_id = conn.execute(statement2).scalar()
+            # The new id arrives with the INSERT's OK packet, so no separate last_insert_id() query is needed
+            business_id = result.lastrowid
             conn.commit()
     except Exception as e:
         logger.exception(e)
@@ -127,41 +219,29 @@ def post_business():
 
 @app.route('/' + BUSINESSES, methods=['GET'])
 def get_businesses():
-    offset = 0
-    limit = 3
-    url = request.url.split("/")
-    # Check to see if final portion of URL is simply 'businesses'. If not, split the url further to get the limit and offset
-    if url[-1] != BUSINESSES:
-        url = url[-1][11:]
-        url = url.split("&")
-        for param in url:
-            if param[:6] == "offset":
-                offset = int(param[-1])
-            else:
-                limit = int(param[-1])
+    """
+    Returns a page of businesses ordered by id. Pages are keyed by the last business_id seen (?after=), so the next
+    link continues from there without MySQL scanning past earlier rows. ?offset= is still accepted but deprecated.
+    """
+    limit = request.args.get('limit', default=3, type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    after = request.args.get('after', default=0, type=int)
+    if not 1 <= limit <= MAX_PAGE_LIMIT or offset < 0 or after < 0:
+        return (PAGINATION_ERROR, 400)
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT * FROM businesses ORDER BY business_id LIMIT :limit OFFSET :offset'
-            )
         businesses = []
-        rows = conn.execute(stmt, parameters={'limit': limit, 'offset': offset})
+        if 'offset' in request.args and 'after' not in request.args:
+            rows = conn.execute(SQL_LIST_BUSINESSES_BY_OFFSET, parameters={'limit': limit, 'offset': offset}).mappings()
+        else:
+            rows = conn.execute(SQL_LIST_BUSINESSES, parameters={'limit': limit, 'after': after}).mappings()
         for row in rows:
-            business = row._asdict()
-            id = business["business_id"]
-            business["self"] = generate_self_url(request.base_url, id)
-            business["id"] = business["business_id"]
-            del business["business_id"]
+            business = dict(row)
+            business["id"] = business.pop("business_id")
+            business["self"] = generate_self_url(request.base_url, business["id"])
             businesses.append(business)
         response_dict = {"entries": businesses}
-        if len(businesses) == limit:
-            offset += limit
-            param_str = f"?offset={int(offset)}&limit={int(limit)}"
-            next_url = request.url.split("?")
-            if len(next_url) > 1:
-                next_url[-1] = param_str
-                response_dict["next"] = "".join(next_url)
-            else:
-                response_dict["next"] = request.base_url + param_str
+        if businesses and len(businesses) == limit:
+            response_dict["next"] = url_for('get_businesses', after=businesses[-1]["id"], limit=limit, _external=True)
         return response_dict
 
 
@@ -179,17 +259,13 @@ def generate_not_found_message(business_or_review: str, id_attribute: str) -> di
 def get_business(id):
     """Gets and returns the business with a business_id corresponding to the given parameter id, or returns 404 if not found."""
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses WHERE business_id=:business_id'
-            )
-        row = conn.execute(stmt, parameters={'business_id': id}).one_or_none()
+        row = conn.execute(SQL_SELECT_BUSINESS, parameters={'business_id': id}).mappings().one_or_none()
         if row is None:
             return (generate_not_found_message(BUSINESSES, BUSINESS_ID), 404)
         else:
-            business = row._asdict()
+            business = dict(row)
             business["self"] = request.base_url
-            business["id"] = business["business_id"]
-            del business["business_id"]
+            business["id"] = business.pop("business_id")
             return business
 
 
@@ -200,40 +276,31 @@ def put_business(id):
     in the request, a 400 error is returned. If no business_id corresponds to the given id, 404 is returned. Else, the updated
     business is returned along with a 200 status code.
     """
-    content = request.get_json()
+    content = get_request_content()
     valid_business = validate_business_post_put(content, BUSINESSES_REQUIRED_ATTRIBUTES)
     if not valid_business:
         return (POST_PUT_ERROR, 400)
     
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses WHERE business_id=:business_id'
-            )
-        row = conn.execute(stmt, parameters={'business_id': id}).one_or_none()
-        if row is None:
+        result = conn.execute(SQL_UPDATE_BUSINESS, parameters={'owner_id': content['owner_id'], 
+                                                'name': content['name'], 
+                                                'street_address': content['street_address'], 
+                                                'city': content['city'], 
+                                                'state': content['state'], 
+                                                'zip_code': content['zip_code'],
+                                                'business_id': id})
+        # rowcount is the number of matched rows (CLIENT.FOUND_ROWS), so 0 means the business does not exist
+        if result.rowcount == 0:
             return (generate_not_found_message(BUSINESSES, BUSINESS_ID), 404)
-        else:
-            stmt = sqlalchemy.text(
-                'UPDATE businesses '
-                'SET owner_id = :owner_id, name = :name, street_address = :street_address, city = :city, state = :state, zip_code = :zip_code '
-                'WHERE business_id = :business_id'
-            )
-            conn.execute(stmt, parameters={'owner_id': content['owner_id'], 
-                                           'name': content['name'], 
-                                           'street_address': content['street_address'], 
-                                           'city': content['city'], 
-                                           'state': content['state'], 
-                                           'zip_code': content['zip_code'],
-                                           'business_id': id})
-            conn.commit()
-            return ({'id': id,
-             'owner_id': content['owner_id'], 
-             'name': content['name'], 
-             'street_address': content['street_address'], 
-             'city': content['city'], 
-             'state': content['state'], 
-             'zip_code': content['zip_code'],
-             'self': request.base_url}, 200)
+        conn.commit()
+        return ({'id': id,
+         'owner_id': content['owner_id'], 
+         'name': content['name'], 
+         'street_address': content['street_address'], 
+         'city': content['city'], 
+         'state': content['state'], 
+         'zip_code': content['zip_code'],
+         'self': request.base_url}, 200)
 
 
 @app.route('/' + BUSINESSES + '/<int:id>', methods=['DELETE'])
@@ -243,17 +310,10 @@ def delete_business(id):
      If no business corresponds to the given id, a 404 error message is returned.
      """
      with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses WHERE business_id=:business_id'
-            )
-        row = conn.execute(stmt, parameters={'business_id': id}).one_or_none()
-        if row is None:
+        result = conn.execute(SQL_DELETE_BUSINESS, parameters={'business_id': id})
+        business_exists_cache.pop(id, None)
+        if result.rowcount == 0:
             return (generate_not_found_message(BUSINESSES, BUSINESS_ID), 404)
-        
-        stmt = sqlalchemy.text(
-                'DELETE FROM businesses WHERE business_id=:business_id'
-            )
-        conn.execute(stmt, parameters={'business_id': id})
         conn.commit()
         return ('', 204)
 
@@ -262,18 +322,13 @@ def delete_business(id):
 def get_owners_businesses(id):
     """Return all businesses associated with the owner with the given id"""
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT * FROM businesses WHERE owner_id=:owner_id'
-            )
-        rows = conn.execute(stmt, parameters={'owner_id': id})
+        rows = conn.execute(SQL_LIST_OWNER_BUSINESSES, parameters={'owner_id': id}).mappings()
+        prefix = request.base_url.rsplit("owners", 1)[0]
         business_list = list()
         for row in rows:
-            business = row._asdict()
-            url = request.base_url.split("owners")
-            url[-1] = BUSINESSES + "/" + str(business["business_id"])
-            business["self"] = "".join(url)
-            business["id"] = business["business_id"]
-            del business["business_id"]
+            business = dict(row)
+            business["id"] = business.pop("business_id")
+            business["self"] = f"{prefix}{BUSINESSES}/{business['id']}"
             business_list.append(business)
         return business_list
 
@@ -281,58 +336,56 @@ def get_owners_businesses(id):
 @app.route('/' + REVIEWS, methods=['POST'])
 def post_review():
     """Create and return a review with the given request. If a required parameter is missing, 400 is returned"""
-    content = request.get_json()
+    content = get_request_content()
     valid_review = validate_business_post_put(content, REVIEWS_REQUIRED_ATTRIBUTES)
+    if not valid_review:
+        return (POST_PUT_ERROR, 400)
+    # Normalized so the cache key matches the int route id that delete_business evicts
+    try:
+        id = int(content["business_id"])
+    except (TypeError, ValueError):
+        return ({"Error": "business_id must be an integer"}, 400)
     has_review_text = False
     if "review_text" in content:
         has_review_text = True
-    if not valid_review:
-        return (POST_PUT_ERROR, 400)
     try:
         with db.connect() as conn:
-            id = content["business_id"]
             # Check if business with given id exists
-            stmt = sqlalchemy.text(
-                'SELECT business_id, owner_id, name, street_address, city, state, zip_code FROM businesses WHERE business_id=:business_id'
-            )
-            row = conn.execute(stmt, parameters={'business_id': id}).one_or_none()
-            if row is None:
-                return (generate_not_found_message(BUSINESSES, BUSINESS_ID), 404)
+            if id not in business_exists_cache:
+                row = conn.execute(SQL_SELECT_BUSINESS_EXISTS, parameters={'business_id': id}).one_or_none()
+                if row is None:
+                    return (generate_not_found_message(BUSINESSES, BUSINESS_ID), 404)
+                business_exists_cache[id] = True
             # Check if user has already left a reivew for this business
-            stmt = sqlalchemy.text(
-                'SELECT * FROM reviews WHERE business_id=:business_id'
-            )
-            row = conn.execute(stmt, parameters={'business_id': id}).one_or_none()
+            row = conn.execute(SQL_SELECT_USER_REVIEW_FOR_BUSINESS, parameters={'business_id': id, 'user_id': content['user_id']}).one_or_none()
             if row is not None:
-                review = row._asdict()
-                if review["user_id"] == content["user_id"]:
-                    error_message = {"Error":  "You have already submitted a review for this business. You can update your previous review, or delete it and submit a new review"} 
-                    return (error_message, 409)
+                error_message = {"Error":  "You have already submitted a review for this business. You can update your previous review, or delete it and submit a new review"} 
+                return (error_message, 409)
             
             if has_review_text:
-                statement = sqlalchemy.text(
-                'INSERT INTO reviews(user_id, business_id, stars, review_text) '
-                ' VALUES (:user_id, :business_id, :stars, :review_text)')
-                conn.execute(statement, parameters={'user_id': content['user_id'], 
-                                        'business_id': content['business_id'], 
+                result = conn.execute(SQL_INSERT_REVIEW, parameters={'user_id': content['user_id'], 
+                                        'business_id': id, 
                                         'stars': content['stars'], 
                                         'review_text': content['review_text']})
             else:
-                statement = sqlalchemy.text(
-                'INSERT INTO reviews(user_id, business_id, stars) '
-                ' VALUES (:user_id, :business_id, :stars)')
-                conn.execute(statement, parameters={'user_id': content['user_id'], 
-                                        'business_id': content['business_id'], 
+                result = conn.execute(SQL_INSERT_REVIEW_WITHOUT_TEXT, parameters={'user_id': content['user_id'], 
+                                        'business_id': id, 
                                         'stars': content['stars']})
             
-            statement2 = sqlalchemy.text('SELECT last_insert_id()')
-            review_id = conn.execute(statement2).scalar()
+            review_id = result.lastrowid
             conn.commit()
+    except sqlalchemy.exc.IntegrityError as e:
+        if e.orig.args[0] != ER.NO_REFERENCED_ROW_2:
+            logger.exception(e)
+            return ({'Error': 'Unable to create review'}, 500)
+        # The foreign key rejected the review, so the business was deleted after it was cached as existing
+        business_exists_cache.pop(id, None)
+        return (generate_not_found_message(BUSINESSES, BUSINESS_ID), 404)
     except Exception as e:
         logger.exception(e)
         return ({'Error': 'Unable to create review'}, 500)
     business_url = request.base_url.split(REVIEWS)
-    business_url[-1] = BUSINESSES + "/" + str(content["business_id"])
+    business_url[-1] = BUSINESSES + "/" + str(id)
     business_url = "".join(business_url)
     if has_review_text:
         return ({'id': review_id,
@@ -353,22 +406,17 @@ def post_review():
 def get_review(id):
     """Gets and returns the review with a review_id corresponding to the given parameter id, or returns 404 if not found."""
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT * FROM reviews WHERE review_id=:review_id'
-            )
-        row = conn.execute(stmt, parameters={'review_id': id}).one_or_none()
+        row = conn.execute(SQL_SELECT_REVIEW, parameters={'review_id': id}).mappings().one_or_none()
         if row is None:
             return (generate_not_found_message(REVIEWS, REVIEW_ID), 404)
         else:
-            review = row._asdict()
+            review = dict(row)
             business_url = request.base_url.split(REVIEWS)
-            business_url[-1] = BUSINESSES + "/" + str(review["business_id"])
+            business_url[-1] = BUSINESSES + "/" + str(review.pop("business_id"))
             business_url = "".join(business_url)
             review["business"] = business_url
-            del review["business_id"]
             review["self"] = request.base_url
-            review["id"] = review["review_id"]
-            del review["review_id"]
+            review["id"] = review.pop("review_id")
             return review
         
 
@@ -379,8 +427,9 @@ def put_review(id):
     in the request, a 400 error is returned. If no review_id corresponds to the given id, 404 is returned. Else, the updated
     review is returned along with a 200 status code.
     """
-    content = request.get_json()
-    if "stars" not in content:
+    content = get_request_content()
+    valid_review = validate_business_post_put(content, REVIEWS_PUT_REQUIRED_ATTRIBUTES)
+    if not valid_review:
         return (POST_PUT_ERROR, 400)
     
     has_review_text = False
@@ -388,46 +437,32 @@ def put_review(id):
         has_review_text = True
 
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT * FROM reviews WHERE review_id=:review_id'
-            )
-        row = conn.execute(stmt, parameters={'review_id': id}).one_or_none()
-        if row is None:
+        if has_review_text:
+            result = conn.execute(SQL_UPDATE_REVIEW, parameters={'stars': content['stars'], 
+                                                    'review_text': content['review_text'],
+                                                    'review_id': id})
+        else:
+            result = conn.execute(SQL_UPDATE_REVIEW_WITHOUT_TEXT, parameters={'stars': content['stars'], 'review_id': id})
+        if result.rowcount == 0:
             return (generate_not_found_message(REVIEWS, REVIEW_ID), 404)
+        # MySQL has no UPDATE ... RETURNING, so read back only the columns the request did not supply
+        if has_review_text:
+            row = conn.execute(SQL_SELECT_REVIEW_USER_AND_BUSINESS, parameters={'review_id': id}).mappings().one()
+            review_text = content['review_text']
         else:
-            if has_review_text:
-                stmt = sqlalchemy.text(
-                'UPDATE reviews '
-                'SET stars = :stars, review_text = :review_text '
-                'WHERE review_id = :review_id')
-                conn.execute(stmt, parameters={'stars': content['stars'], 
-                                           'review_text': content['review_text'],
-                                           'review_id': id})
-            else:
-                stmt = sqlalchemy.text(
-                'UPDATE reviews '
-                'SET stars = :stars '
-                'WHERE review_id = :review_id')
-                conn.execute(stmt, parameters={'stars': content['stars'], 'review_id': id})
-            conn.commit()
-            
-            row = row._asdict()
-            business_url = request.base_url.split(REVIEWS)
-            business_url[-1] = BUSINESSES + "/" + str(row["business_id"])
-            business_url = "".join(business_url)
-            row["stars"] = content["stars"]
-            row["business"] = business_url
-            del row["business_id"]
-            row["id"] = row["review_id"]
-            del row["review_id"]
-            if has_review_text:
-                row["review_text"] = content["review_text"]
-            elif row["review_text"]:
-                row["review_text"] = row["review_text"]
-            else:
-                row["review_text"] = ''
-            row["self"] = request.base_url
-            return row, 200
+            row = conn.execute(SQL_SELECT_REVIEW, parameters={'review_id': id}).mappings().one()
+            review_text = row['review_text']
+        conn.commit()
+
+    business_url = request.base_url.split(REVIEWS)
+    business_url[-1] = BUSINESSES + "/" + str(row["business_id"])
+    business_url = "".join(business_url)
+    return ({'id': id,
+             'user_id': row['user_id'],
+             'business': business_url,
+             'stars': content['stars'],
+             'review_text': review_text or '',
+             'self': request.base_url}, 200)
         
 
 @app.route('/' + REVIEWS + '/<int:id>', methods=['DELETE'])
@@ -437,17 +472,9 @@ def delete_review(id):
      If no reivew corresponds to the given id, a 404 error message is returned.
      """
      with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT * FROM reviews WHERE review_id=:review_id'
-            )
-        row = conn.execute(stmt, parameters={'review_id': id}).one_or_none()
-        if row is None:
+        result = conn.execute(SQL_DELETE_REVIEW, parameters={'review_id': id})
+        if result.rowcount == 0:
             return (generate_not_found_message(REVIEWS, REVIEW_ID), 404)
-        
-        stmt = sqlalchemy.text(
-                'DELETE FROM reviews WHERE review_id=:review_id'
-            )
-        conn.execute(stmt, parameters={'review_id': id})
         conn.commit()
         return ('', 204)
 
@@ -456,29 +483,20 @@ def delete_review(id):
 def get_users_reviews(id):
     """Return all reviews associated with the user with the given id"""
     with db.connect() as conn:
-        stmt = sqlalchemy.text(
-                'SELECT * FROM reviews WHERE user_id=:user_id'
-            )
-        rows = conn.execute(stmt, parameters={'user_id': id})
+        rows = conn.execute(SQL_LIST_USER_REVIEWS, parameters={'user_id': id}).mappings()
+        # The url prefix is the same for every row, so it is only computed once
+        prefix = request.base_url.rsplit("users", 1)[0]
         review_list = list()
         for row in rows:
-            review = row._asdict()
-            url = request.base_url.split("users")
-            url[-1] = REVIEWS + "/" + str(review["review_id"])
-            review["self"] = "".join(url)
-            business_id = review["business_id"]
-            url = request.base_url.split("users")
-            url[-1] = BUSINESSES + "/" + str(business_id)
-            review["business"] = "".join(url)
-            del review["business_id"]
-            review["id"] = review["review_id"]
-            del review["review_id"]
-            review_list.append(review)
+            review_list.append({'id': row["review_id"],
+                                'user_id': row["user_id"],
+                                'stars': row["stars"],
+                                'review_text': row["review_text"],
+                                'business': f"{prefix}{BUSINESSES}/{row['business_id']}",
+                                'self': f"{prefix}{REVIEWS}/{row['review_id']}"})
         return review_list
     
 
 if __name__ == '__main__':
     init_db()
-    create_table_businesses(db)
-    create_table_reviews(db)
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    app.run(host='0.0.0.0', port=8080)